@@ -1,12 +1,15 @@
 import os 
 import sys
 import asyncio
-import json
 import re
+import time
+import functools
+import hashlib
+from pathlib import Path
 from typing import Optional
+from collections import OrderedDict, deque
 from contextlib import AsyncExitStack
-from gen_ai_hub.proxy.langchain.openai import ChatOpenAI
-from langchain.schema.messages import HumanMessage, SystemMessage
+import orjson
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from dotenv import load_dotenv
@@ -21,39 +24,181 @@ AICORE_CLIENT_SECRET = os.getenv("AICORE_CLIENT_SECRET")
 AICORE_RESOURCE_GROUP = os.getenv("AICORE_RESOURCE_GROUP")
 AICORE_BASE_URL = os.getenv("AICORE_BASE_URL")
 LLM_DEPLOYMENT_ID = "d38dd2015862a15d"
+HANA_SCHEMA = os.getenv("HANA_SCHEMA")
+
+# On-disk schema cache, shared across client runs
+SCHEMA_CACHE_DIR = os.path.expanduser("~/.cache/mcp_client")
+SCHEMA_CACHE_TTL = 3600  # seconds
+
+# Interpreter used to launch an MCP server script, by file extension
+_CMD_BY_EXT = {'.py': 'python', '.js': 'node'}
+
+# Server-side tool that runs a tool and interprets its result in one request
+COMPOUND_TOOL = "invoke_and_interpret"
+
+# Only answers produced purely by these tools are safe to replay from cache
+READ_ONLY_TOOLS = frozenset({"get_data", "get_schema"})
+RESPONSE_CACHE_SIZE = 256
+
+# Conversation history is bounded by prompt size rather than message count
+MAX_MEMORY_TOKENS = 3000
+
+# Queries in flight at once in --batch mode
+BATCH_CONCURRENCY = 8
+
+# === Precompiled patterns ===
+_TOOL_RE = re.compile(r"TOOL:\s*(\w+)")
+_PARAMS_RE = re.compile(r"PARAMS:\s*(\{.*\})", re.DOTALL)
+# Phrases that mark a query as a pasted "Key: Value" insert
+_INSERT_INTENT_RE = re.compile(r"(?:add|insert) this data", re.IGNORECASE)
+# One TOOL/PARAMS block per match; neither part may run into the next "TOOL:"
+_TOOL_CALL_RE = re.compile(
+    r"TOOL:\s*(?P<tool>\w+)(?:(?!TOOL:).)*?PARAMS:\s*(?P<params>\{(?:(?!TOOL:).)*\})",
+    re.DOTALL,
+)
+
+# Characters allowed in a field label, e.g. "Customer ID", "Postal-Code", "Phone (Work)"
+_KEY_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 -()/")
+
+def parse_tool_calls(response_text):
+    """Parse every TOOL/PARAMS block in the response, in order."""
+    calls = [
+        (match['tool'], orjson.loads(match['params']))
+        for match in _TOOL_CALL_RE.finditer(response_text)
+    ]
+    if calls:
+        return calls
+
+    # Slow path for responses that put PARAMS before TOOL
+    tool_match = _TOOL_RE.search(response_text)
+    params_match = _PARAMS_RE.search(response_text)
+    if tool_match and params_match:
+        return [(tool_match.group(1), orjson.loads(params_match.group(1)))]
+    return []
 
 def parse_tool_response(response_text):
-    tool_match = re.search(r"TOOL:\s*(\w+)", response_text)
-    params_match = re.search(r"PARAMS:\s*(\{.*\})", response_text, re.DOTALL)
-    if tool_match and params_match:
-        tool_name = tool_match.group(1)
-        params = json.loads(params_match.group(1))
-        return tool_name, params
+    calls = parse_tool_calls(response_text)
+    if calls:
+        return calls[0]
     return None, None
 
+@functools.cache
+def _llm_classes():
+    """Import the LLM client and message classes on first use.
+
+    langchain and the AI Core SDK are slow to import, so usage errors and
+    other early exits return without paying for them.
+    """
+    from gen_ai_hub.proxy.langchain.openai import ChatOpenAI
+    from langchain.schema.messages import HumanMessage, SystemMessage
+    return ChatOpenAI, HumanMessage, SystemMessage
+
+def first_text(tool_result) -> str:
+    """Return the first text block of a tool result without touching the rest."""
+    return next((c.text for c in (getattr(tool_result, 'content', None) or ()) if hasattr(c, 'text')), "")
+
+def format_simple_result(data):
+    """Answer tiny tool results locally (same rules as server.py and c3.py); None means ask the LLM."""
+    if not isinstance(data, (dict, list)):
+        return str(data)
+    if not isinstance(data, dict):
+        return None
+    # Write confirmations already carry a human-readable message
+    if "message" in data and str(data.get("object", "")).endswith("_result"):
+        return f"✅ {data['message']}"
+    for key in ('count', 'total'):
+        value = data.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f"{key.capitalize()}: {value}"
+    if 0 < len(data) <= 2 and all(isinstance(v, (str, int, float, bool)) or v is None for v in data.values()):
+        return ", ".join(f"{k}: {v}" for k, v in data.items())
+    return None
+
+def _approx_tokens(message) -> int:
+    """Cheap token estimate (~4 characters per token) for history trimming."""
+    return len(message.content) // 4
+
+def _scan_fields(text: str, valid_keys=None) -> dict:
+    """Split "Key: Value" runs in a single left-to-right pass over text.
+
+    The label before each ':' is found by walking back over key characters.
+    When valid_keys is given, only the longest suffix of that run naming a
+    known column is taken as a key; other colons stay part of the value.
+    The walk back is then capped at the longest column name, and the pending
+    value's first non-blank character is found once per accepted key, so
+    colons rejected as keys never rescan the value text.
+    """
+    fields = {}
+    key = None
+    value_start = 0
+    value_first = 0
+    longest_key = max(map(len, valid_keys), default=0) if valid_keys is not None else 0
+    colon = text.find(':')
+    while colon != -1:
+        # A pending value keeps at least its first non-blank character
+        floor = min(value_first, colon) + 1 if key is not None else 0
+        if valid_keys is not None:
+            label_end = colon
+            while label_end > floor and text[label_end - 1].isspace():
+                label_end -= 1
+            floor = max(floor, label_end - longest_key)
+        start = colon
+        while start > floor and text[start - 1] in _KEY_CHARS:
+            start -= 1
+
+        candidate = text[start:colon].strip()
+        if valid_keys is not None:
+            while candidate and candidate not in valid_keys:
+                start += 1
+                candidate = text[start:colon].strip()
+
+        if candidate:
+            if key is not None:
+                fields[key] = text[value_start:start].strip()
+            key = candidate
+            value_start = value_first = colon + 1
+            while value_first < len(text) and text[value_first].isspace():
+                value_first += 1
+        colon = text.find(':', colon + 1)
+
+    if key is not None:
+        fields[key] = text[value_start:].strip()
+    return fields
+
 # Helper to extract key-value pairs from messy text
 def extract_fields(text):
-    pattern = r'([A-Za-z0-9 \-\(\)/]+):\s*([^\n]+?)(?=(?:[A-Za-z0-9 \-\(\)/]+:)|$)'
-    matches = re.findall(pattern, text)
-    return {k.strip(): v.strip() for k, v in matches}
+    return _scan_fields(text)
 
 class MCPClient:
     def __init__(self):
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
         self.tools = []
-        self.memory = []
+        self.memory = deque()
+        self._memory_tokens = 0
         self.schema = {}
+        self._valid_columns = {}
+        self._schema_cache_path = None
+        self._tool_lines = []
+        self._tool_block = ""
+        self._system_prompt = None
+        self._response_cache = OrderedDict()
+        # One LLM client for the whole session so its HTTP pool and auth token are reused
+        ChatOpenAI, _, _ = _llm_classes()
+        self.llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
 
     # === Connect to Server ===
     async def connect_to_server(self, server_script_path: str):
-        is_python = server_script_path.endswith('.py')
-        is_js = server_script_path.endswith('.js')
-        if not (is_python or is_js):
+        command = _CMD_BY_EXT.get(os.path.splitext(server_script_path)[1])
+        if command is None:
             raise ValueError("Server script must be a .py or .js file")
 
-        command = "python" if is_python else "node"
         server_params = StdioServerParameters(command=command, args=[server_script_path], env=None)
+        # Key the cache on the server script and the HANA schema it serves
+        server_path = os.path.realpath(server_script_path)
+        server_name = os.path.splitext(os.path.basename(server_path))[0]
+        cache_key = hashlib.sha256(f"{server_path}\0{HANA_SCHEMA}".encode()).hexdigest()[:16]
+        self._schema_cache_path = os.path.join(SCHEMA_CACHE_DIR, f"schema-{server_name}-{cache_key}.json")
 
         stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
         self.stdio, self.write = stdio_transport
@@ -66,33 +211,81 @@ class MCPClient:
         self.tools = response.tools
         print("\n✅ Connected to server with tools:", [tool.name for tool in self.tools])
 
+        # Tool schemas are fixed for the session: render their prompt lines once
+        self._tool_lines = [
+            f"- {tool.name}({self._format_params(tool)}): {tool.description}"
+            for tool in self.tools if tool.name != COMPOUND_TOOL
+        ]
+        self._tool_block = "\n".join(self._tool_lines)
+        self._system_prompt = None
+        self.build_system_prompt()
+
         # Fetch table schema
         await self.fetch_table_schema()
 
-    async def fetch_table_schema(self):
+    async def fetch_table_schema(self, force_refresh=False):
         """Fetch schema from server and store valid columns per table."""
         self.schema = {}
-        tool_result = await self.session.call_tool("get_schema", {})
-        if hasattr(tool_result, 'content') and tool_result.content:
-            for content in tool_result.content:
-                if hasattr(content, 'text'):
-                    try:
-                        schema_data = json.loads(content.text)
-                        if "schema" in schema_data:
-                            self.schema = schema_data["schema"]
-                            print("\n✅ Fetched schema for tables:", list(self.schema.keys()))
-                    except json.JSONDecodeError:
-                        print("⚠️ Failed to parse schema JSON.")
-
-    async def process_query(self, query: str) -> str:
+        self._valid_columns = {}
+
+        # Reuse a recent on-disk copy instead of querying the server
+        if not force_refresh and self._schema_cache_path:
+            try:
+                if time.time() - os.path.getmtime(self._schema_cache_path) < SCHEMA_CACHE_TTL:
+                    with open(self._schema_cache_path, 'rb') as f:
+                        self._set_schema(orjson.loads(f.read()))
+                    print("\n✅ Loaded cached schema for tables:", list(self.schema.keys()))
+                    return
+            except (OSError, orjson.JSONDecodeError):
+                pass
+
+        # On a forced refresh, also make the server drop its own schema cache
+        schema_tool = "get_schema"
+        if force_refresh and any(tool.name == "refresh_schema" for tool in self.tools):
+            schema_tool = "refresh_schema"
+        tool_result = await self.session.call_tool(schema_tool, {})
+        schema_text = first_text(tool_result)
+        if schema_text:
+            try:
+                schema_data = orjson.loads(schema_text)
+                if "schema" in schema_data:
+                    self._set_schema(schema_data["schema"])
+                    print("\n✅ Fetched schema for tables:", list(self.schema.keys()))
+                    self._save_schema_cache()
+            except orjson.JSONDecodeError:
+                print("⚠️ Failed to parse schema JSON.")
+
+    def _set_schema(self, schema: dict):
+        """Store the schema and its per-table column-name sets."""
+        self.schema = schema
+        self._valid_columns = {
+            table: frozenset(field["name"] for field in spec["fields"])
+            for table, spec in self.schema.items()
+        }
+
+    def _save_schema_cache(self):
+        """Write the current schema to the on-disk cache (best effort)."""
+        if not self._schema_cache_path:
+            return
+        try:
+            os.makedirs(SCHEMA_CACHE_DIR, exist_ok=True)
+            with open(self._schema_cache_path, 'wb') as f:
+                f.write(orjson.dumps(self.schema))
+        except OSError as e:
+            print(f"⚠️ Failed to write schema cache: {e}")
+
+    async def process_query(self, query: str, use_memory: bool = True) -> str:
+        # Replay answers to repeated read-only questions
+        cache_key = query.strip().lower()
+        if cache_key in self._response_cache:
+            self._response_cache.move_to_end(cache_key)
+            return self._response_cache[cache_key]
+
         # Try to extract fields if it's an "add" operation
-        if "add this data" in query.lower() or "insert this data" in query.lower():
+        if _INSERT_INTENT_RE.search(query):
             extracted_data = self.extract_fields(query)
             if extracted_data:
-                valid_columns = []
-                if "Customer" in self.schema:
-                    valid_columns = [field["name"] for field in self.schema["Customer"]["fields"]]
-
+                valid_columns = self._valid_columns.get("Customer", frozenset())
                 filtered_data = {k: v for k, v in extracted_data.items() if k in valid_columns}
 
                 if not filtered_data:
@@ -102,60 +295,97 @@ class MCPClient:
                 query = f"Add this data to the Customer table:\n{formatted_data}"
 
         # Prepare LLM system prompt
-        system_prompt = self.build_system_prompt()
-
-        lc_messages = [SystemMessage(content=system_prompt)]
-        lc_messages.extend(self.memory)
-        lc_messages.append(HumanMessage(content=query))
-
-        llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
-        llm_response = llm.invoke(lc_messages)
+        _, HumanMessage, SystemMessage = _llm_classes()
+        human_message = HumanMessage(content=query)
+        lc_messages = [SystemMessage(content=self.build_system_prompt())]
+        if use_memory:
+            lc_messages.extend(self.memory)
+        lc_messages.append(human_message)
+
+        llm_response = await self.llm.ainvoke(lc_messages)
         response_text = llm_response.content
 
-        # Store memory
-        self.memory.append(HumanMessage(content=query))
-        self.memory.append(llm_response)
-        MAX_MEMORY = 10
-        if len(self.memory) > MAX_MEMORY * 2:
-            self.memory = self.memory[-MAX_MEMORY * 2:]
-
-        # Parse tool response
-        tool_name, params = parse_tool_response(response_text)
-        if tool_name:
-            if isinstance(params, dict):
-                params.setdefault('table', 'Customer')
-                params.setdefault('schema', 'SAC_1')
-
-            tool_result = await self.session.call_tool(tool_name, params)
-            processed_result = await self._process_tool_result(query, tool_name, tool_result)
-            return processed_result
+        # Store memory, dropping the oldest exchanges once over the token budget
+        if use_memory:
+            self.memory.append(human_message)
+            self.memory.append(llm_response)
+            self._memory_tokens += _approx_tokens(human_message) + _approx_tokens(llm_response)
+            while self._memory_tokens > MAX_MEMORY_TOKENS and len(self.memory) > 2:
+                self._memory_tokens -= _approx_tokens(self.memory.popleft()) + _approx_tokens(self.memory.popleft())
+
+        # Parse tool response; all-read-only tool calls are dispatched concurrently
+        tool_calls = parse_tool_calls(response_text)
+        if tool_calls:
+            for _, params in tool_calls:
+                if isinstance(params, dict):
+                    params.setdefault('table', 'Customer')
+                    params.setdefault('schema', 'SAC_1')
+
+            read_only = all(tool_name in READ_ONLY_TOOLS for tool_name, _ in tool_calls)
+            if read_only:
+                processed_results = await asyncio.gather(*(
+                    self._run_tool(query, tool_name, params) for tool_name, params in tool_calls
+                ))
+            else:
+                # A read after a write must see it, so keep the model's order
+                processed_results = [
+                    await self._run_tool(query, tool_name, params) for tool_name, params in tool_calls
+                ]
+            response = "\n\n".join(text for text, _ in processed_results)
+
+            if read_only:
+                # Tool failures are reported, not raised; never replay them
+                if all(succeeded for _, succeeded in processed_results):
+                    self._response_cache[cache_key] = response
+                    if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                        self._response_cache.popitem(last=False)
+            else:
+                # Data changed, so earlier answers may be stale
+                self._response_cache.clear()
+            return response
         else:
             return response_text
 
+    async def _run_tool(self, query: str, tool_name: str, params: dict) -> tuple[str, bool]:
+        """Run a tool and interpret its result, server-side when the server supports it.
+
+        Returns the answer text and whether the tool call succeeded; call_tool
+        reports tool errors through isError rather than raising.
+        """
+        if any(tool.name == COMPOUND_TOOL for tool in self.tools):
+            tool_result = await self.session.call_tool(
+                COMPOUND_TOOL, {"query": query, "tool_name": tool_name, "params": params}
+            )
+            answer = first_text(tool_result) or "Sorry. I couldn't retrieve the data from the tool."
+            return answer, not getattr(tool_result, 'isError', False)
+
+        # Fall back to the client-side tool -> LLM chain
+        tool_result = await self.session.call_tool(tool_name, params)
+        answer = await self._process_tool_result(query, tool_name, tool_result)
+        return answer, not getattr(tool_result, 'isError', False)
+
     def extract_fields(self, text: str) -> dict:
         """Extract key-value pairs from concatenated field input."""
-        pattern = r'([A-Za-z0-9\s\-]+?):\s*(.*?)(?=[A-Za-z0-9\s\-]+?:|$)'
-        matches = re.findall(pattern, text)
-        extracted = {key.strip(): value.strip() for key, value in matches}
-        return extracted
+        return _scan_fields(text, self._valid_columns.get("Customer"))
+
+    @staticmethod
+    def _format_params(tool) -> str:
+        """Render a tool's parameters as "name: type, ..." for the prompt."""
+        if hasattr(tool, 'input_schema') and tool.input_schema and 'properties' in tool.input_schema:
+            return ', '.join(f'{name}: {prop.get("type", "any")}' for name, prop in tool.input_schema['properties'].items())
+        elif hasattr(tool, 'parameters') and tool.parameters:
+            return ', '.join(f'{param.name}: {param.type}' for param in tool.parameters if hasattr(param, 'name') and hasattr(param, 'type'))
+        return ''
 
     def build_system_prompt(self) -> str:
-        """Construct the system prompt with tool descriptions."""
-        def format_tool_params(tool):
-            if hasattr(tool, 'input_schema') and tool.input_schema and 'properties' in tool.input_schema:
-                return ', '.join(f'{name}: {prop.get("type", "any")}' for name, prop in tool.input_schema['properties'].items())
-            elif hasattr(tool, 'parameters') and tool.parameters:
-                return ', '.join(f'{param.name}: {param.type}' for param in tool.parameters if hasattr(param, 'name') and hasattr(param, 'type'))
-            return ''
-
-        tool_descriptions = "\n".join([
-            f"- {tool.name}({format_tool_params(tool)}): {tool.description}" for tool in self.tools
-        ])
-
-        return (
+        """Return the system prompt, rendering it from the pre-built tool block if needed."""
+        if self._system_prompt is not None:
+            return self._system_prompt
+
+        self._system_prompt = (
             "You are a helpful assistant with access to database tools. Your primary purpose is to add new rows into the table. "
             "You have access to the following tools:\n"
-            f"{tool_descriptions}\n\n"
+            f"{self._tool_block}\n\n"
             "IMPORTANT INSTRUCTIONS:\n"
             "- When users ask to INSERT, ADD, CREATE data or row or record to a table/database, you MUST use the insert_data tool.\n"
             "- When users ask about data counts, retrieving data, or querying information, use the get_data tool.\n"
@@ -169,60 +399,100 @@ class MCPClient:
             "- Never respond with raw JSON outside of PARAMS format.\n"
             "- Be concise and human-like.\n"
         )
+        return self._system_prompt
 
     async def _process_tool_result(self, original_query: str, tool_name: str, tool_result) -> str:
         """Process tool result into human-readable form."""
-        result_text = ""
-        if hasattr(tool_result, 'content') and tool_result.content:
-            for content in tool_result.content:
-                if hasattr(content, 'text'):
-                    result_text = content.text
-                    break
-
+        result_text = first_text(tool_result)
         if not result_text:
             return "Sorry. I couldn't retrieve the data from the tool."
 
         try:
-            data = json.loads(result_text)
-        except json.JSONDecodeError:
+            data = orjson.loads(result_text)
+        except orjson.JSONDecodeError:
             return f"Retrieved data: {result_text}"
 
-        llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
+        simple_answer = format_simple_result(data)
+        if simple_answer is not None:
+            return simple_answer
+
         interpretation_prompt = (
             f"The user asked: \"{original_query}\"\n\n"
-            f"The tool '{tool_name}' returned this data:\n{json.dumps(data, indent=2)}\n\n"
+            f"The tool '{tool_name}' returned this data:\n{orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()}\n\n"
             "Please provide a clear, direct answer to the user's question based on this data. Be concise and avoid technical details unless necessary."
         )
-        interpretation_response = llm.invoke([HumanMessage(content=interpretation_prompt)])
+        _, HumanMessage, _ = _llm_classes()
+        interpretation_response = await self.llm.ainvoke([HumanMessage(content=interpretation_prompt)])
         return interpretation_response.content
 
     async def chat_loop(self):
-        print("\n🤖 S4HANA MCP Client Started — Type your queries or 'quit/exit' to exit.")
+        print("\n🤖 S4HANA MCP Client Started — Type your queries, 'refresh' to reload the schema or 'quit/exit' to exit.")
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()
                 if query.lower() in ('quit', 'exit'):
                     break
+                if query.lower() == 'refresh':
+                    # Cached answers may have been built from the old schema
+                    self._response_cache.clear()
+                    await self.fetch_table_schema(force_refresh=True)
+                    continue
                 response = await self.process_query(query)
                 print("\n💬 Response:\n" + response)
             except Exception as e:
                 print(f"\n❌ Error: {str(e)}")
 
+    async def batch_run(self, queries_path: str):
+        """Run newline-separated queries from a file concurrently, printing results in input order.
+
+        Batch queries are independent: they neither read nor extend the chat
+        history, so each answer is the same whatever order the others finish in.
+        """
+        queries = [line.strip() for line in Path(queries_path).read_text().splitlines() if line.strip()]
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def run(query):
+            async with semaphore:
+                try:
+                    return await self.process_query(query, use_memory=False)
+                except Exception as e:
+                    return f"❌ Error: {str(e)}"
+
+        responses = await asyncio.gather(*(run(query) for query in queries))
+        for query, response in zip(queries, responses):
+            print(f"\nQuery: {query}\n💬 Response:\n{response}")
+
     async def cleanup(self):
         await self.exit_stack.aclose()
 
 
 async def main():
-    if len(sys.argv) < 2:
-        print("Usage: python client.py <path_to_server_script>")
+    args = sys.argv[1:]
+    batch_path = None
+    if "--batch" in args:
+        i = args.index("--batch")
+        batch_path = args[i + 1] if i + 1 < len(args) else None
+        del args[i:i + 2]
+    if len(args) < 1 or ("--batch" in sys.argv and batch_path is None):
+        print("Usage: python client.py <path_to_server_script> [--batch <queries_file>]")
         sys.exit(1)
 
     client = MCPClient()
     try:
-        await client.connect_to_server(sys.argv[1])
-        await client.chat_loop()
+        await client.connect_to_server(args[0])
+        if batch_path:
+            await client.batch_run(batch_path)
+        else:
+            await client.chat_loop()
     finally:
         await client.cleanup()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Prefer the libuv-based loop where available; it is optional
+    try:
+        import uvloop
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        runner.run(main())
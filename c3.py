@@ -3,16 +3,17 @@
 import os
 import sys
 import asyncio
-import json
 import re
-from typing import Optional
-from contextlib import AsyncExitStack
-from gen_ai_hub.proxy.langchain.openai import ChatOpenAI
-from langchain.schema.messages import HumanMessage, SystemMessage
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+import functools
+from collections import deque
+from typing import Optional, TYPE_CHECKING
+from contextlib import AsyncExitStack, suppress
+import orjson
 from dotenv import load_dotenv
  
+if TYPE_CHECKING:
+    from mcp import ClientSession
+ 
 # === Load environment variables ===
 load_dotenv()
  
@@ -23,42 +24,265 @@ AICORE_CLIENT_SECRET = os.getenv("AICORE_CLIENT_SECRET")
 AICORE_RESOURCE_GROUP = os.getenv("AICORE_RESOURCE_GROUP")
 AICORE_BASE_URL = os.getenv("AICORE_BASE_URL")
 LLM_DEPLOYMENT_ID = "d38dd2015862a15d"
+MAX_MEMORY = 10  # exchanges (human + assistant message pairs) kept as chat history
+BATCH_CONCURRENCY = 8  # queries in flight at once in --batch mode
+SIMPLE_RESULT_MAX_CHARS = 512  # larger tool results skip the local fast path and its JSON parse
+ 
+# === Precompiled patterns ===
+_TOOL_RE = re.compile(r"TOOL:\s*(\w+)")
+_PARAMS_RE = re.compile(r"PARAMS:\s*(\{.*\})", re.DOTALL)
+_MD_JSON_FENCE = "```json"
+_MD_FENCE = "```"
+# "column: value" / "column = value" pairs for local, pre-LLM insert parameter derivation
+_PAIR_RE = re.compile(r"(\w+)\s*[:=]\s*([^,;\n:=]+)")
+_PAIR_SEP_RE = re.compile(r"\s*[,;\n]\s*")
+_WORD_RE = re.compile(r"\w+")
+# Words allowed around the pairs of an input that is safe to insert without the LLM
+_SPEC_PREFIX_WORDS = frozenset({"please", "insert", "add", "create", "save", "store", "new",
+                                "record", "row", "to", "into", "the", "a", "table", "with"})
+_SPEC_VALUE_STOPWORDS = frozenset({"into", "to", "in", "and", "please", "table", "with"})
+_INT_TYPES = frozenset({"tinyint", "smallint", "integer", "int", "bigint"})
+_FLOAT_TYPES = frozenset({"decimal", "smalldecimal", "real", "double", "float"})
+ 
+# Write intents, detected with a single case-insensitive scan of the query
+_INTENT_KEYWORDS = {
+    "insert": ('insert', 'add', 'create', 'new record', 'new row', 'save', 'store'),
+    "delete": ('delete', 'remove', 'drop'),
+    "update": ('update', 'modify', 'change', 'set'),
+}
+def _inflections(keyword):
+    """Regex for a keyword and its verb/noun inflections ("adds", "added", "updating", "deletion").
+ 
+    Only these suffixes are accepted, so words that merely start with a
+    keyword ("address", "settings") are not treated as write intents.
+    """
+    stem = re.escape(keyword)
+    forms = [stem + r"(?:s|es|ed|d|ing)?"]
+    if keyword.endswith('e'):
+        forms.append(re.escape(keyword[:-1]) + r"(?:ing|ion|ions)")
+    elif keyword[-1] not in 'aeiouy':
+        forms.append(stem + re.escape(keyword[-1]) + r"(?:ed|ing)")
+    return "|".join(forms)
+ 
+# One named group per intent, so match.lastgroup names the handler
+_INTENT_RE = re.compile(
+    r"\b(?:" + "|".join(
+        f"(?P<{intent}>" + "|".join(map(_inflections, kws)) + ")"
+        for intent, kws in _INTENT_KEYWORDS.items()
+    ) + r")\b",
+    re.IGNORECASE,
+)
+ 
+# Per write operation: expected result object, success and error message templates
+_CRUD_RESULTS = {
+    "insert": ("insert_result",
+               "✅ Successfully inserted record into {table} table with {count} fields.",
+               "❌ Error inserting data into {table}: {result}"),
+    "delete": ("delete_result",
+               "✅ Successfully deleted record(s) from {table}.",
+               "❌ Error deleting data from {table}: {result}"),
+    "update": ("update_result",
+               "✅ Successfully updated record(s) in {table}.",
+               "❌ Error updating data in {table}: {result}"),
+}
+ 
+# Static instruction text for the schema-aware write prompts
+_INSERT_INSTRUCTIONS = """You are a database insertion assistant. Build insert_data parameters for the user's request.
+- Table: the one the user names, else "Customer"
+- Use exact column names from the schema and convert values to the column types
+- For missing required fields, use reasonable defaults
+Reply ONLY with:
+TOOL: insert_data
+PARAMS: {"table": "<table_name>", "data": {"column1": "value1", "column2": "value2"}}"""
+ 
+_DELETE_INSTRUCTIONS = """You are a database assistant. Build delete_data parameters for the user's request.
+- Table: the one the user names, else "Customer"
+- Take the filter conditions from the user input, using exact column names from the schema
+Reply ONLY with:
+TOOL: delete_data
+PARAMS: {"table": "<table_name>", "where": {"column1": "value1"}}"""
+ 
+_UPDATE_INSTRUCTIONS = """You are a database assistant. Build update_data parameters for the user's request.
+- Table: the one the user names, else "Customer"
+- "data" holds the columns to change and their new values, "where" the filter conditions
+- Use exact column names from the schema
+Reply ONLY with:
+TOOL: update_data
+PARAMS: {"table": "<table_name>", "data": {"column1": "new_value"}, "where": {"column2": "match_value"}}"""
+ 
+def _compact_schema(schema_data) -> str:
+    """Render the schema as one "Table(col:type, ...)" line per table for prompts"""
+    tables = (schema_data or {}).get("schema")
+    if not isinstance(tables, dict):
+        raw = (schema_data or {}).get("raw_schema")
+        return raw if isinstance(raw, str) else orjson.dumps(schema_data).decode()
+    return "\n".join(
+        f"{name}(" + ", ".join(f"{f.get('name')}:{f.get('type', 'any')}" for f in table.get("fields", ())) + ")"
+        for name, table in tables.items()
+    )
+ 
+@functools.cache
+def _llm_classes():
+    """Import the LLM client and message classes on first use.
+ 
+    langchain and the AI Core SDK are slow to import, so usage errors and
+    other early exits return without paying for them.
+    """
+    from gen_ai_hub.proxy.langchain.openai import ChatOpenAI
+    from langchain.schema.messages import HumanMessage, SystemMessage
+    return ChatOpenAI, HumanMessage, SystemMessage
+ 
+def _extract_text(tool_result) -> str:
+    """Return the first text block of an MCP tool result, or "" if there is none"""
+    return next((c.text for c in (getattr(tool_result, 'content', None) or ()) if hasattr(c, 'text')), "")
+ 
+def _convert_value(value, column_type):
+    """Convert a value to its column type; raises ValueError when it does not fit"""
+    if column_type in _INT_TYPES:
+        return int(value)
+    if column_type in _FLOAT_TYPES:
+        return float(value)
+    if column_type == "boolean":
+        if value.lower() not in ("true", "false"):
+            raise ValueError(value)
+        return value.lower() == "true"
+    return value
+ 
+def _speculative_insert_params(user_input, schema_data, default_table="Customer"):
+    """Derive insert_data params locally, or None unless the input is unambiguous.
+ 
+    The input must be nothing but insert wording, at most one table name and
+    "col: value" pairs separated by , ; or newlines, where every column exists
+    and every value converts to its column type.
+    """
+    tables = (schema_data or {}).get("schema")
+    if not isinstance(tables, dict):
+        return None
+    table_names = {name.lower(): name for name in tables}
+ 
+    matches = list(_PAIR_RE.finditer(user_input))
+    if not matches:
+        return None
+    prefix_words = [w.lower() for w in _WORD_RE.findall(user_input[:matches[0].start()])]
+    named_tables = {table_names[w] for w in prefix_words if w in table_names}
+    if any(w not in _SPEC_PREFIX_WORDS and w not in table_names for w in prefix_words) or len(named_tables) > 1:
+        return None
+    table = named_tables.pop() if named_tables else table_names.get(default_table.lower())
+    if table is None:
+        return None
+ 
+    # Pairs must cover the rest of the input, with only separators between them
+    for prev, match in zip(matches, matches[1:]):
+        if not _PAIR_SEP_RE.fullmatch(user_input[prev.end():match.start()]):
+            return None
+    if user_input[matches[-1].end():].strip(" \t\n."):
+        return None
+ 
+    fields = {f["name"].lower(): f for f in tables[table].get("fields", ()) if "name" in f}
+    data = {}
+    for match in matches:
+        key, value = match.group(1).lower(), match.group(2).strip()
+        value_words = {w.lower() for w in _WORD_RE.findall(value)}
+        if key not in fields or not value or value_words & (_SPEC_VALUE_STOPWORDS | table_names.keys()):
+            return None
+        field = fields[key]
+        try:
+            data[field["name"]] = _convert_value(value, str(field.get("type", "")).lower())
+        except ValueError:
+            return None
+    return {"table": table, "data": data}
+ 
+def _same_insert(a, b):
+    """Compare insert params ignoring table/column case and how numbers are spelled"""
+    def norm_value(v):
+        text = str(v).strip().lower()
+        try:
+            return float(text)
+        except ValueError:
+            return text
+    def norm(p):
+        data = p.get("data")
+        return (str(p.get("table", "")).lower(),
+                {str(k).lower(): norm_value(v) for k, v in data.items()} if isinstance(data, dict) else data)
+    return norm(a) == norm(b)
+ 
+def _crud_succeeded(tool_result, result_object) -> bool:
+    """Whether a write tool result reports success"""
+    if getattr(tool_result, 'isError', False):
+        return False
+    result_text = _extract_text(tool_result)
+    try:
+        result_json = orjson.loads(result_text)
+        if not isinstance(result_json, dict):
+            return True
+        msg_lower = (result_json.get('message') or "").lower()
+        return 'successfully' in msg_lower or result_json.get('object') == result_object
+    except orjson.JSONDecodeError:
+        # Fallback to text-based checking
+        result_lower = result_text.lower()
+        return not ('error' in result_lower or 'failed' in result_lower)
+ 
+def _format_simple_result(data):
+    """Answer tiny tool results locally (same rules as server.py and c2.py); None means ask the LLM"""
+    if not isinstance(data, (dict, list)):
+        return str(data)
+    if not isinstance(data, dict):
+        return None
+    # Write confirmations already carry a human-readable message
+    if "message" in data and str(data.get("object", "")).endswith("_result"):
+        return f"✅ {data['message']}"
+    for key in ('count', 'total'):
+        value = data.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f"{key.capitalize()}: {value}"
+    if 0 < len(data) <= 2 and all(isinstance(v, (str, int, float, bool)) or v is None for v in data.values()):
+        return ", ".join(f"{k}: {v}" for k, v in data.items())
+    return None
  
 def parse_tool_response(response_text):
     # First try the standard TOOL:/PARAMS: format
-    tool_match = re.search(r"TOOL:\s*(\w+)", response_text)
-    params_match = re.search(r"PARAMS:\s*(\{.*\})", response_text, re.DOTALL)
+    tool_match = _TOOL_RE.search(response_text)
+    params_match = _PARAMS_RE.search(response_text)
     if tool_match and params_match:
         tool_name = tool_match.group(1)
-        params = json.loads(params_match.group(1))
+        params = orjson.loads(params_match.group(1))
         return tool_name, params
    
     # Try to parse JSON format response
     try:
         # Remove markdown code blocks if present
-        cleaned_text = response_text.strip()
-        if cleaned_text.startswith('```json'):
-            cleaned_text = cleaned_text[7:]
-        if cleaned_text.endswith('```'):
-            cleaned_text = cleaned_text[:-3]
-        cleaned_text = cleaned_text.strip()
+        # A bare ``` fence is stripped too when the block is not tagged as json
+        cleaned_text = (response_text.strip().removeprefix(_MD_JSON_FENCE).removeprefix(_MD_FENCE)
+                        .removesuffix(_MD_FENCE).strip())
        
         # Parse JSON
-        json_response = json.loads(cleaned_text)
+        json_response = orjson.loads(cleaned_text)
         if 'TOOL' in json_response and 'PARAMS' in json_response:
             return json_response['TOOL'], json_response['PARAMS']
-    except (json.JSONDecodeError, KeyError):
+    except (orjson.JSONDecodeError, KeyError):
         pass
    
     return None, None
  
 class MCPClient:
-    def __init__(self):
-        self.session: Optional[ClientSession] = None
+    def __init__(self, speculative: bool = False):
+        self.session: "Optional[ClientSession]" = None
+        # Issue writes optimistically alongside the planning LLM call (opt-in: --speculative)
+        self.speculative = speculative
         self.exit_stack = AsyncExitStack()
         self.tools = []
-        self.memory = []
+        self.memory = deque(maxlen=MAX_MEMORY * 2)
         self.cached_schema = None
+        self.cached_schema_str = None
+        self._schema_task = None
+        # Task that entered the exit stack; anyio requires the same task to close it
+        self._owner_task = None
+        self._tool_descriptions = ""
+        self._system_prompt = None
+        # Shared LLM clients so HTTP connections and auth tokens are reused across turns
+        ChatOpenAI, _, _ = _llm_classes()
+        self._llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
+        self._llm_det = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID, temperature=0)
  
     # === Connect to Server ===
     async def connect_to_server(self, server_script_path: str):
@@ -67,6 +291,10 @@ class MCPClient:
         if not (is_python or is_js):
             raise ValueError("Server script must be a .py or .js file")
  
+        from mcp import ClientSession, StdioServerParameters
+        from mcp.client.stdio import stdio_client
+ 
+        self._owner_task = asyncio.current_task()
         command = "python" if is_python else "node"
         server_params = StdioServerParameters(
             command=command,
@@ -85,6 +313,60 @@ class MCPClient:
         self.tools = response.tools
         print("\n✅ Connected to server with tools:", [tool.name for tool in self.tools])
  
+        # The tool list is fixed for the session, so the prompt is built once here
+        self._build_system_prompt()
+ 
+        # Warm the schema cache in the background while the user types the first query
+        self._schema_task = asyncio.create_task(self.get_schema())
+ 
+    # === Prompt Construction ===
+    @staticmethod
+    def _format_tool_params(tool) -> str:
+        """Render a tool's parameters as "name: type, ..." for the system prompt"""
+        if hasattr(tool, 'input_schema') and tool.input_schema and 'properties' in tool.input_schema:
+            params = [f'{name}: {prop.get("type", "any")}' for name, prop in tool.input_schema['properties'].items()]
+            return ', '.join(params)
+        elif hasattr(tool, 'parameters') and tool.parameters:
+            if isinstance(tool.parameters, list):
+                params = [f'{param.name}: {param.type}' for param in tool.parameters if hasattr(param, 'name') and hasattr(param, 'type')]
+                return ', '.join(params)
+        return ''
+ 
+    def _build_system_prompt(self):
+        """Build the tool descriptions and system prompt once per tool listing"""
+        self._tool_descriptions = "\n".join([
+            f"- {tool.name}({self._format_tool_params(tool)}): {tool.description}"
+            for tool in self.tools
+        ])
+        _, _, SystemMessage = _llm_classes()
+        self._system_prompt = SystemMessage(content=(
+            "You are a helpful assistant with access to database tools. "
+            f"You have access to the following tools:\n{self._tool_descriptions}\n\n"
+            "IMPORTANT INSTRUCTIONS:\n"
+            "- When users ask about data counts, retrieving data, or querying information, use the get_data tool.\n"
+            "- When users ask about table structure or schema, use the get_schema tool.\n"
+            "- For data insertion requests, they will be handled by a specialized process.\n"
+            "- Choose default table and schema as follows:\n"
+            "  - Default Schema: SAC_1\n"
+            "  - Default Table: Customer\n"
+            " - Always stay with default table and schema unless specified otherwise.\n"
+            "- If the user fails to mention the table name, use 'Customer' as default.\n"
+            "- If you need to use a tool, respond ONLY in this exact format:\n"
+            "  TOOL: <tool_name>\n"
+            "  PARAMS: <JSON parameters>\n"
+            "- If no tool is needed, provide a clear, natural, conversational response in plain text.\n"
+            "- Never respond in JSON format unless specifically asked.\n"
+            "- Be helpful, concise, and human-like in your responses.\n"
+            "- Answer questions directly without unnecessary formatting.\n"
+            "- When calling tools, always use the exact parameter names as defined:\n"
+            "  - For delete_data, use:\n"
+            "    TOOL: delete_data\n"
+            "    PARAMS: {\"table\": \"<table_name>\", \"where\": {\"<column>\": \"<value>\"}}\n"
+            "  - For update_data, always use:\n"
+            "    TOOL: update_data\n"
+            "    PARAMS: {\"table\": \"<table_name>\", \"data\": {\"<column_to_update>\": \"<new_value>\"}, \"where\": {\"<column_to_match>\": \"<match_value>\"}}\n"
+        ))
+ 
     # === Get Schema with Caching ===
     async def get_schema(self, force_refresh=False):
         """Retrieve database schema, with caching for performance"""
@@ -95,211 +377,152 @@ class MCPClient:
             tool_result = await self.session.call_tool("get_schema", {})
            
             # Extract schema data from tool result
-            schema_text = ""
-            if hasattr(tool_result, 'content') and tool_result.content:
-                for content in tool_result.content:
-                    if hasattr(content, 'text'):
-                        schema_text = content.text
-                        break
+            schema_text = _extract_text(tool_result)
            
             if schema_text:
                 try:
-                    self.cached_schema = json.loads(schema_text)
-                    return self.cached_schema
-                except json.JSONDecodeError:
+                    self.cached_schema = orjson.loads(schema_text)
+                except orjson.JSONDecodeError:
                     self.cached_schema = {"raw_schema": schema_text}
-                    return self.cached_schema
+                # Render once for the CRUD prompts; refreshed together with the schema
+                self.cached_schema_str = _compact_schema(self.cached_schema)
+                return self.cached_schema
         except Exception as e:
             print(f"⚠️ Warning: Could not retrieve schema - {str(e)}")
             return None
        
         return None
  
+    def _schema_text(self, schema_data: dict) -> str:
+        """Compact schema text for prompts, reusing the cached rendering when possible"""
+        if schema_data is self.cached_schema and self.cached_schema_str is not None:
+            return self.cached_schema_str
+        return _compact_schema(schema_data)
+ 
     # === Schema-Aware Data Insertion ===
     async def handle_data_insertion(self, user_input: str, schema_data: dict):
         """Handle data insertion using schema-aware LLM processing"""
        
-        schema_prompt = f"""
-        You are a database insertion assistant. The user wants to insert data into a database.
-       
-        DATABASE SCHEMA:
-        {json.dumps(schema_data, indent=2)}
-       
-        USER INPUT: "{user_input}"
-       
-        TASK: Analyze the user input and create appropriate insert_data parameters based on the schema.
-       
-        INSTRUCTIONS:
-        1. Identify which table the user wants to insert data into (default: "Customer" if unclear)
-        2. Extract the data values from the user input
-        3. Match the extracted data with the appropriate schema columns
-        4. Handle data type conversions (strings, numbers, dates, etc.)
-        5. Set reasonable defaults for missing required fields if possible
-        6. Return ONLY in this exact format:
-       
-        TOOL: insert_data
-        PARAMS: {{"table": "<table_name>", "data": {{"column1": "value1", "column2": "value2"}}}}
+        schema_prompt = f"{_INSERT_INSTRUCTIONS}\nSCHEMA:\n{self._schema_text(schema_data)}\nUSER: {user_input}"
        
-        IMPORTANT:
-        - Use exact column names from the schema
-        - Convert values to appropriate data types
-        - For missing required fields, use reasonable defaults or ask for clarification
-        - If the table name is ambiguous, use "Customer" as default
-        - Ensure all JSON is properly formatted
-        """
-       
-        llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
+        _, HumanMessage, _ = _llm_classes()
         lc_messages = [HumanMessage(content=schema_prompt)]
        
-        llm_response = llm.invoke(lc_messages)
+        # With clear "column: value" input, start the insert while the LLM is still planning
+        llm_task = asyncio.create_task(self._llm.ainvoke(lc_messages))
+        spec_params = _speculative_insert_params(user_input, schema_data) if self.speculative else None
+        spec_task = asyncio.create_task(self.session.call_tool("insert_data", spec_params)) if spec_params else None
+       
+        try:
+            llm_response = await llm_task
+        except Exception:
+            if spec_task is None:
+                raise
+            # The speculative insert may have committed even though planning
+            # failed; report its outcome so a retry does not insert the row twice
+            try:
+                spec_result = await spec_task
+            except Exception as e:
+                return f"❌ Error inserting data: {str(e)}"
+            return await self._process_crud_result(spec_result, spec_params, "insert")
         response_text = llm_response.content
        
         # Parse the LLM response for tool call
         tool_name, params = parse_tool_response(response_text)
        
+        if spec_task is not None:
+            # The speculative write may already have landed, so it is reconciled
+            # with the plan instead of being issued a second time
+            planned = tool_name == "insert_data" and params
+            try:
+                spec_result = await spec_task
+                spec_ok = _crud_succeeded(spec_result, "insert_result")
+            except Exception as e:
+                spec_result, spec_ok = str(e), False
+            if spec_ok:
+                if planned and _same_insert(spec_params, params):
+                    return await self._process_crud_result(spec_result, spec_params, "insert")
+                planner_view = params if planned else response_text
+                return (f"⚠️ Inserted {spec_params['data']} into {spec_params['table']} from your input, "
+                        f"but the planner proposed {planner_view}. Please check the new row.")
+            if not planned or _same_insert(spec_params, params):
+                if isinstance(spec_result, str):
+                    return f"❌ Error inserting data: {spec_result}"
+                return await self._process_crud_result(spec_result, spec_params, "insert")
+            # The speculative insert failed and the planner wants something else: run its plan
+       
         if tool_name == "insert_data" and params:
             # Execute the insertion
             try:
                 tool_result = await self.session.call_tool(tool_name, params)
                
                 # Process and return user-friendly response
-                return await self._process_insertion_result(user_input, tool_result, params)
+                return await self._process_crud_result(tool_result, params, "insert")
                
             except Exception as e:
                 return f"❌ Error inserting data: {str(e)}"
         else:
             return f"❌ Could not parse the insertion request. LLM Response: {response_text}"
  
-    async def _process_insertion_result(self, original_input: str, tool_result, params: dict) -> str:
-        """Process insertion result and provide user-friendly feedback"""
-       
-        # Extract result from tool response
-        result_text = ""
-        if hasattr(tool_result, 'content') and tool_result.content:
-            for content in tool_result.content:
-                if hasattr(content, 'text'):
-                    result_text = content.text
-                    break
-       
-        # Create a simple confirmation without using LLM
+    async def _process_crud_result(self, tool_result, params: dict, operation: str) -> str:
+        """Turn an insert/delete/update tool result into user-friendly feedback without using the LLM"""
+        result_object, success_message, error_message = _CRUD_RESULTS[operation]
+        result_text = _extract_text(tool_result)
         table_name = params.get('table', 'table')
-        inserted_data = params.get('data', {})
+        record_count = len(params.get('data', {}))
        
-        # Parse the JSON response to check for success
-        try:
-            result_json = json.loads(result_text)
-            # Check for success indicators
-            if (result_json.get('message', '').lower().find('successfully') != -1 or
-                result_json.get('object') == 'insert_result'):
-                record_count = len(inserted_data)
-                return f"✅ Successfully inserted record into {table_name} table with {record_count} fields."
-            else:
-                return f"❌ Error inserting data into {table_name}: {result_text}"
-        except json.JSONDecodeError:
-            # Fallback to text-based checking
-            if ("error" in result_text.lower() or "failed" in result_text.lower()):
-                return f"❌ Error inserting data into {table_name}: {result_text}"
-            else:
-                record_count = len(inserted_data)
-                return f"✅ Successfully inserted record into {table_name} table with {record_count} fields."
+        if _crud_succeeded(tool_result, result_object):
+            return success_message.format(table=table_name, count=record_count)
+        return error_message.format(table=table_name, result=result_text)
  
     # === Main Query Processing ===
-    async def process_query(self, query: str) -> str:
-        # Build system prompt with tool descriptions
-        def format_tool_params(tool):
-            if hasattr(tool, 'input_schema') and tool.input_schema and 'properties' in tool.input_schema:
-                params = [f'{name}: {prop.get("type", "any")}' for name, prop in tool.input_schema['properties'].items()]
-                return ', '.join(params)
-            elif hasattr(tool, 'parameters') and tool.parameters:
-                if isinstance(tool.parameters, list):
-                    params = [f'{param.name}: {param.type}' for param in tool.parameters if hasattr(param, 'name') and hasattr(param, 'type')]
-                    return ', '.join(params)
-            return ''
-       
-        tool_descriptions = "\n".join([
-            f"- {tool.name}({format_tool_params(tool)}): {tool.description}"
-            for tool in self.tools
-        ])
+    async def process_query(self, query: str, on_token=None, use_memory: bool = True) -> str:
+        # Start the schema fetch right away so it overlaps with intent detection;
+        # non-CRUD queries let it finish to warm the cache. A fetch still in
+        # flight (e.g. the connect-time warmup) is joined rather than repeated
+        schema_task = self._schema_task
+        if schema_task is None or schema_task.done():
+            schema_task = asyncio.create_task(self.get_schema())
+            self._schema_task = schema_task
  
         # Check if this is a data insertion, deletion, or update request
-        insertion_keywords = ['insert', 'add', 'create', 'new record', 'new row', 'save', 'store']
-        deletion_keywords = ['delete', 'remove', 'drop']
-        update_keywords = ['update', 'modify', 'change', 'set']
- 
-        lower_query = query.lower()
-        if any(keyword in lower_query for keyword in insertion_keywords):
-            schema_data = await self.get_schema()
-            if schema_data:
-                return await self.handle_data_insertion(query, schema_data)
-            else:
-                print("⚠️ Schema not available, using fallback method")
-        elif any(keyword in lower_query for keyword in deletion_keywords):
-            schema_data = await self.get_schema()
-            if schema_data:
-                return await self.handle_data_deletion(query, schema_data)
-            else:
-                print("⚠️ Schema not available, using fallback method")
-        elif any(keyword in lower_query for keyword in update_keywords):
-            schema_data = await self.get_schema()
+        intent_handlers = {
+            "insert": self.handle_data_insertion,
+            "delete": self.handle_data_deletion,
+            "update": self.handle_data_update,
+        }
+        intent_match = _INTENT_RE.search(query)
+        if intent_match:
+            schema_data = await schema_task
             if schema_data:
-                return await self.handle_data_update(query, schema_data)
+                intent = intent_match.lastgroup
+                return await intent_handlers[intent](query, schema_data)
             else:
                 print("⚠️ Schema not available, using fallback method")
  
         # For non-insertion requests or fallback, use original processing
-        system_prompt = (
-            "You are a helpful assistant with access to database tools. "
-            f"You have access to the following tools:\n{tool_descriptions}\n\n"
-            "IMPORTANT INSTRUCTIONS:\n"
-            "- When users ask about data counts, retrieving data, or querying information, use the get_data tool.\n"
-            "- When users ask about table structure or schema, use the get_schema tool.\n"
-            "- For data insertion requests, they will be handled by a specialized process.\n"
-            "- Choose default table and schema as follows:\n"
-            "  - Default Schema: SAC_1\n"
-            "  - Default Table: Customer\n"
-            " - Always stay with default table and schema unless specified otherwise.\n"
-            "- If the user fails to mention the table name, use 'Customer' as default.\n"
-            "- If you need to use a tool, respond ONLY in this exact format:\n"
-            "  TOOL: <tool_name>\n"
-            "  PARAMS: <JSON parameters>\n"
-            "- If no tool is needed, provide a clear, natural, conversational response in plain text.\n"
-            "- Never respond in JSON format unless specifically asked.\n"
-            "- Be helpful, concise, and human-like in your responses.\n"
-            "- Answer questions directly without unnecessary formatting.\n"
-            "- When calling tools, always use the exact parameter names as defined:\n"
-            "  - For delete_data, use:\n"
-            "    TOOL: delete_data\n"
-            "    PARAMS: {\"table\": \"<table_name>\", \"where\": {\"<column>\": \"<value>\"}}\n"
-            "  - For update_data, always use:\n"
-            "    TOOL: update_data\n"
-            "    PARAMS: {\"table\": \"<table_name>\", \"data\": {\"<column_to_update>\": \"<new_value>\"}, \"where\": {\"<column_to_match>\": \"<match_value>\"}}\n"
-        )
+        _, HumanMessage, _ = _llm_classes()
+        history = self.memory if use_memory else ()
+        lc_messages = [self._system_prompt, *history, HumanMessage(content=query)]
  
-        lc_messages = [SystemMessage(content=system_prompt)]
-        lc_messages.extend(self.memory)
-        lc_messages.append(HumanMessage(content=query))
- 
-        llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID, temperature=0)
-        llm_response = llm.invoke(lc_messages)
+        llm_response = await self._llm_det.ainvoke(lc_messages)
         response_text = llm_response.content
  
-        # Store the latest exchange in memory
-        self.memory.append(HumanMessage(content=query))
-        self.memory.append(llm_response)
-        MAX_MEMORY = 10
-        if len(self.memory) > MAX_MEMORY * 2:
-            self.memory = self.memory[-MAX_MEMORY*2:]
+        # Store the latest exchange in memory; the deque evicts the oldest messages
+        if use_memory:
+            self.memory.append(HumanMessage(content=query))
+            self.memory.append(llm_response)
  
         # Clean up response if it's in JSON format
         if response_text.strip().startswith('{') and response_text.strip().endswith('}'):
             try:
-                json_response = json.loads(response_text)
+                json_response = orjson.loads(response_text)
                 # Extract the actual response from common JSON structures
                 for key in ['response', 'answer', 'content', 'message']:
                     if key in json_response:
                         response_text = json_response[key]
                         break
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 pass  # If it's not valid JSON, keep original response
  
         tool_name, params = parse_tool_response(response_text)
@@ -314,29 +537,30 @@ class MCPClient:
             tool_result = await self.session.call_tool(tool_name, params)
  
             # Post-process the tool result
-            processed_result = await self._process_tool_result(query, tool_name, tool_result)
+            processed_result = await self._process_tool_result(query, tool_name, tool_result, on_token)
             return processed_result
         else:
             return response_text
  
-    async def _process_tool_result(self, original_query: str, tool_name: str, tool_result) -> str:
+    async def _process_tool_result(self, original_query: str, tool_name: str, tool_result, on_token=None) -> str:
         """Process tool result and provide a clear, human-readable answer"""
        
         # Extract the actual data from the tool result
-        result_text = ""
-        if hasattr(tool_result, 'content') and tool_result.content:
-            for content in tool_result.content:
-                if hasattr(content, 'text'):
-                    result_text = content.text
-                    break
+        result_text = _extract_text(tool_result)
        
         if not result_text:
             return "Sorry. I couldn't retrieve the data from the tool."
        
-        # Parse JSON if it's JSON data
-        try:
-            data = json.loads(result_text)
-        except json.JSONDecodeError:
+        if len(result_text) <= SIMPLE_RESULT_MAX_CHARS:
+            # Answer trivially small results directly instead of a second LLM round-trip
+            try:
+                data = orjson.loads(result_text)
+            except orjson.JSONDecodeError:
+                return f"Retrieved data: {result_text}"
+            simple_answer = _format_simple_result(data)
+            if simple_answer is not None:
+                return simple_answer
+        elif not result_text.lstrip().startswith(('{', '[')):
             return f"Retrieved data: {result_text}"
        
         # Use LLM to interpret the data and answer the original question
@@ -344,7 +568,7 @@ class MCPClient:
         The user asked: "{original_query}"
        
         The tool '{tool_name}' returned this data:
-        {json.dumps(data, indent=2)}
+        {result_text}
        
         Please provide a clear, direct answer to the user's question based on this data.
         Be concise and human-friendly. Focus on answering exactly what they asked.
@@ -352,11 +576,19 @@ class MCPClient:
         Do not include JSON or technical details unless specifically requested.
         """
        
-        llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
+        _, HumanMessage, _ = _llm_classes()
         lc_messages = [HumanMessage(content=interpretation_prompt)]
-        interpretation_response = llm.invoke(lc_messages)
+        if on_token is None:
+            interpretation_response = await self._llm.ainvoke(lc_messages)
+            return interpretation_response.content
        
-        return interpretation_response.content
+        # Stream the answer to the caller as it is generated
+        parts = []
+        async for chunk in self._llm.astream(lc_messages):
+            if chunk.content:
+                on_token(chunk.content)
+                parts.append(chunk.content)
+        return "".join(parts)
  
     # === Chat Loop ===
     async def chat_loop(self):
@@ -365,149 +597,126 @@ class MCPClient:
        
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()
                 if query.lower() in ('quit', 'exit'):
                     break
  
-                response = await self.process_query(query)
-                print("\n💬 Response:\n" + response)
+                # Only the final interpretation is streamed; tool-call planning and
+                # CRUD confirmations arrive whole and are printed afterwards
+                streamed = False
+                def on_token(token):
+                    nonlocal streamed
+                    if not streamed:
+                        print("\n💬 Response:")
+                        streamed = True
+                    print(token, end="", flush=True)
+ 
+                response = await self.process_query(query, on_token=on_token)
+                if streamed:
+                    print()
+                else:
+                    print("\n💬 Response:\n" + response)
  
             except Exception as e:
                 print(f"\n❌ Error: {str(e)}")
  
+    # === Batch Processing ===
+    async def process_queries(self, queries: list[str]) -> list[str]:
+        """Run independent queries concurrently against the same MCP session.
+ 
+        At most BATCH_CONCURRENCY queries are in flight at once. Batch queries
+        neither see nor extend the chat memory, so each is answered on its own.
+        """
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+ 
+        async def run(query):
+            async with semaphore:
+                try:
+                    return await self.process_query(query, use_memory=False)
+                except Exception as e:
+                    return f"❌ Error: {str(e)}"
+ 
+        return await asyncio.gather(*(run(query) for query in queries))
+ 
     # === Cleanup ===
     async def cleanup(self):
+        # Closing the stdio context from another task trips anyio's cancel scope
+        # check and tears the session down uncleanly, so refuse instead
+        if self._owner_task is not None and asyncio.current_task() is not self._owner_task:
+            raise RuntimeError("cleanup() must be awaited from the task that called connect_to_server()")
+        # A schema fetch still in flight would otherwise fail against the closed session
+        if self._schema_task is not None and not self._schema_task.done():
+            self._schema_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._schema_task
         await self.exit_stack.aclose()
  
     # === Data Deletion ===
     async def handle_data_deletion(self, user_input: str, schema_data: dict):
         """Handle data deletion using schema-aware LLM processing"""
-        schema_prompt = f"""
-        You are a database assistant. The user wants to delete data from a database.
- 
-        DATABASE SCHEMA:
-        {json.dumps(schema_data, indent=2)}
- 
-        USER INPUT: "{user_input}"
- 
-        TASK: Analyze the user input and create appropriate delete_data parameters based on the schema.
- 
-        INSTRUCTIONS:
-        1. Identify which table the user wants to delete data from (default: "Customer" if unclear)
-        2. Extract the filter conditions from the user input
-        3. Match the extracted columns with the schema
-        4. Return ONLY in this exact format:
- 
-        TOOL: delete_data
-        PARAMS: {{"table": "<table_name>", "where": {{"column1": "value1"}}}}
-        """
-        llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
+        schema_prompt = f"{_DELETE_INSTRUCTIONS}\nSCHEMA:\n{self._schema_text(schema_data)}\nUSER: {user_input}"
+        _, HumanMessage, _ = _llm_classes()
         lc_messages = [HumanMessage(content=schema_prompt)]
-        llm_response = llm.invoke(lc_messages)
+        llm_response = await self._llm.ainvoke(lc_messages)
         response_text = llm_response.content
  
         tool_name, params = parse_tool_response(response_text)
         if tool_name == "delete_data" and params:
             try:
                 tool_result = await self.session.call_tool(tool_name, params)
-                return await self._process_deletion_result(user_input, tool_result, params)
+                return await self._process_crud_result(tool_result, params, "delete")
             except Exception as e:
                 return f"❌ Error deleting data: {str(e)}"
         else:
             return f"❌ Could not parse the deletion request. LLM Response: {response_text}"
  
-    async def _process_deletion_result(self, original_input: str, tool_result, params: dict) -> str:
-        """Process deletion result and provide user-friendly feedback"""
-        result_text = ""
-        if hasattr(tool_result, 'content') and tool_result.content:
-            for content in tool_result.content:
-                if hasattr(content, 'text'):
-                    result_text = content.text
-                    break
-        table_name = params.get('table', 'table')
-        try:
-            result_json = json.loads(result_text)
-            if (result_json.get('message', '').lower().find('successfully') != -1 or
-                result_json.get('object') == 'delete_result'):
-                return f"✅ Successfully deleted record(s) from {table_name}."
-            else:
-                return f"❌ Error deleting data from {table_name}: {result_text}"
-        except json.JSONDecodeError:
-            if ("error" in result_text.lower() or "failed" in result_text.lower()):
-                return f"❌ Error deleting data from {table_name}: {result_text}"
-            else:
-                return f"✅ Successfully deleted record(s) from {table_name}."
- 
     # === Data Update ===
     async def handle_data_update(self, user_input: str, schema_data: dict):
         """Handle data update using schema-aware LLM processing"""
-        schema_prompt = f"""
-        You are a database assistant. The user wants to update data in a database.
- 
-        DATABASE SCHEMA:
-        {json.dumps(schema_data, indent=2)}
- 
-        USER INPUT: "{user_input}"
- 
-        TASK: Analyze the user input and create appropriate update_data parameters based on the schema.
- 
-        INSTRUCTIONS:
-        1. Identify which table the user wants to update (default: "Customer" if unclear)
-        2. Extract the columns to update and their new values from the user input
-        3. Extract the filter conditions (where clause) from the user input
-        4. Match the extracted columns with the schema
-        5. Return ONLY in this exact format:
- 
-        TOOL: update_data
-        PARAMS: {{"table": "<table_name>", "data": {{"column1": "new_value"}}, "where": {{"column2": "match_value"}}}}
-        """
-        llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
+        schema_prompt = f"{_UPDATE_INSTRUCTIONS}\nSCHEMA:\n{self._schema_text(schema_data)}\nUSER: {user_input}"
+        _, HumanMessage, _ = _llm_classes()
         lc_messages = [HumanMessage(content=schema_prompt)]
-        llm_response = llm.invoke(lc_messages)
+        llm_response = await self._llm.ainvoke(lc_messages)
         response_text = llm_response.content
  
         tool_name, params = parse_tool_response(response_text)
         if tool_name == "update_data" and params:
             try:
                 tool_result = await self.session.call_tool(tool_name, params)
-                return await self._process_update_result(user_input, tool_result, params)
+                return await self._process_crud_result(tool_result, params, "update")
             except Exception as e:
                 return f"❌ Error updating data: {str(e)}"
         else:
             return f"❌ Could not parse the update request. LLM Response: {response_text}"
  
-    async def _process_update_result(self, original_input: str, tool_result, params: dict) -> str:
-        """Process update result and provide user-friendly feedback"""
-        result_text = ""
-        if hasattr(tool_result, 'content') and tool_result.content:
-            for content in tool_result.content:
-                if hasattr(content, 'text'):
-                    result_text = content.text
-                    break
-        table_name = params.get('table', 'table')
-        try:
-            result_json = json.loads(result_text)
-            if (result_json.get('message', '').lower().find('successfully') != -1 or
-                result_json.get('object') == 'update_result'):
-                return f"✅ Successfully updated record(s) in {table_name}."
-            else:
-                return f"❌ Error updating data in {table_name}: {result_text}"
-        except json.JSONDecodeError:
-            if ("error" in result_text.lower() or "failed" in result_text.lower()):
-                return f"❌ Error updating data in {table_name}: {result_text}"
-            else:
-                return f"✅ Successfully updated record(s) in {table_name}."
- 
 # === Entry Point ===
 async def main():
-    if len(sys.argv) < 2:
-        print("Usage: python client.py <path_to_server_script>")
+    args = sys.argv[1:]
+    speculative = "--speculative" in args
+    if speculative:
+        args.remove("--speculative")
+    batch_path = None
+    if "--batch" in args:
+        i = args.index("--batch")
+        batch_path = args[i + 1] if i + 1 < len(args) else None
+        del args[i:i + 2]
+    if len(args) < 1 or ("--batch" in sys.argv and batch_path is None):
+        print("Usage: python client.py <path_to_server_script> [--batch <queries_file>] [--speculative]")
         sys.exit(1)
  
-    client = MCPClient()
+    client = MCPClient(speculative=speculative)
+    # connect_to_server and cleanup must both run on this coroutine's task so the
+    # stdio session persists for the whole run and closes on the task that opened it
     try:
-        await client.connect_to_server(sys.argv[1])
-        await client.chat_loop()
+        await client.connect_to_server(args[0])
+        if batch_path:
+            with open(batch_path) as f:
+                queries = [line.strip() for line in f if line.strip()]
+            responses = await client.process_queries(queries)
+            for query, response in zip(queries, responses):
+                print(f"\nQuery: {query}\n💬 Response:\n{response}")
+        else:
+            await client.chat_loop()
     finally:
         await client.cleanup()
  
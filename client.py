@@ -3,14 +3,32 @@ import sys
 import asyncio
 import json
 import re
+import hashlib
+import time
+from collections import OrderedDict, deque
 from typing import Optional
-from contextlib import AsyncExitStack
+from contextlib import AsyncExitStack, suppress
 from gen_ai_hub.proxy.langchain.openai import ChatOpenAI
 from langchain.schema.messages import HumanMessage, SystemMessage
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from dotenv import load_dotenv
 
+# orjson parses and emits JSON several times faster; its JSONDecodeError
+# subclasses json.JSONDecodeError, so the except clauses cover both
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+
+    def _json_dumps_indent(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps_indent(obj):
+        return json.dumps(obj, indent=2)
+
 load_dotenv()
 
 AICORE_CLIENT_ID = os.getenv("AICORE_CLIENT_ID")
@@ -20,28 +38,112 @@ AICORE_RESOURCE_GROUP = os.getenv("AICORE_RESOURCE_GROUP")
 AICORE_BASE_URL = os.getenv("AICORE_BASE_URL")
 LLM_DEPLOYMENT_ID = "d38dd2015862a15d"
 
+# LLM replies that lead to these tools change data and are never replayed from cache
+WRITE_TOOLS = frozenset({"insert_data", "update_data", "delete_data"})
+LLM_CACHE_SIZE = 256
+# Tool results shorter than this are shown as-is instead of being interpreted by the LLM
+SMALL_RESULT_CHARS = 200
+# Schema text older than this is re-fetched in the background while waiting for input
+SCHEMA_REFRESH_SECS = 300
+MAX_MEMORY = 10  # exchanges (human + assistant message pairs) kept as chat history
+# Only queries mentioning one of these are scanned for "Key: Value" insert data
+INSERT_KEYWORDS = ("add", "insert", "create", "new customer", "record")
+
+# Patterns used on every query, compiled once
+_TOOL_RE = re.compile(r"TOOL:\s*(\w+)")
+_PARAMS_RE = re.compile(r"PARAMS:\s*(\{.*\})", re.DOTALL)
+_GET_SCHEMA_RE = re.compile(r"get_schema\s*\(\s*\)?", re.IGNORECASE)
+
+# Characters allowed in a field label, e.g. "Customer ID", "Postal-Code", "Phone (Work)"
+_KEY_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 -()/")
+
+def _json_object_end(text):
+    """Index just past the object opening text[0], or -1 if its braces never balance"""
+    depth = 0
+    in_string = escaped = False
+    for i, c in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
 def parse_tool_response(response_text):
-    tool_match = re.search(r"TOOL:\s*(\w+)", response_text)
-    params_match = re.search(r"PARAMS:\s*(\{.*\})", response_text, re.DOTALL)
+    tool_match = _TOOL_RE.search(response_text)
+    params_match = _PARAMS_RE.search(response_text)
     if tool_match and params_match:
-        tool_name = tool_match.group(1)
-        params = json.loads(params_match.group(1))
-        return tool_name, params
+        # The greedy PARAMS match can run past the object into trailing text;
+        # cut it at the balancing brace and give up quietly on almost-JSON
+        params_text = params_match.group(1)
+        end = _json_object_end(params_text)
+        if end == -1:
+            return None, None
+        try:
+            params = _json_loads(params_text[:end])
+        except json.JSONDecodeError:
+            return None, None
+        return tool_match.group(1), params
     return None, None
 
 # Helper to extract key-value pairs from messy text
 def extract_fields(text):
-    pattern = r'([A-Za-z0-9 \-\(\)/]+):\s*([^\n]+?)(?=(?:[A-Za-z0-9 \-\(\)/]+:)|$)'
-    matches = re.findall(pattern, text)
-    return {k.strip(): v.strip() for k, v in matches}
+    """Split "Key: Value" runs in a single left-to-right pass over text.
+
+    The label before each ':' is found by walking back over key characters,
+    never past the first character of the pending value. That character is
+    found once per accepted key, so rejected colons never rescan the value.
+    """
+    fields = {}
+    key = None
+    value_start = 0
+    value_first = 0
+    colon = text.find(':')
+    while colon != -1:
+        # A pending value keeps at least its first non-blank character
+        floor = min(value_first, colon) + 1 if key is not None else 0
+        start = colon
+        while start > floor and text[start - 1] in _KEY_CHARS:
+            start -= 1
+
+        candidate = text[start:colon].strip()
+        if candidate:
+            if key is not None:
+                fields[key] = text[value_start:start].strip()
+            key = candidate
+            value_start = value_first = colon + 1
+            while value_first < len(text) and text[value_first].isspace():
+                value_first += 1
+        colon = text.find(':', colon + 1)
+
+    if key is not None:
+        fields[key] = text[value_start:].strip()
+    return fields
 
 class MCPClient:
     def __init__(self):
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
         self.tools = []
-        self.memory = []
+        self.memory = deque(maxlen=MAX_MEMORY * 2)
         self.schema_text = ""
+        self._tool_descriptions = ""
+        self._schema_fetched_at = 0.0
+        self._schema_refresh = None
+        self._system_prompt = ""
+        self._llm_cache: OrderedDict[str, object] = OrderedDict()
+        # One client for the session so its HTTP connections and OAuth token are reused
+        self._llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
 
     async def connect_to_server(self, server_script_path: str):
         is_python = server_script_path.endswith('.py')
@@ -65,8 +167,21 @@ class MCPClient:
         response = await self.session.list_tools()
         self.tools = response.tools
         print("\n✅ Connected to server with tools:", [tool.name for tool in self.tools])
+        self._tool_descriptions = "\n".join([
+            f"- {tool.name}({self.format_tool_params(tool)}): {tool.description}"
+            for tool in self.tools
+        ])
 
         # Fetch schema for LLM prompt enrichment
+        await self._fetch_schema()
+
+        # Tools and schema are fixed for the connection, so the prompt is built once
+        self._system_prompt = self._build_system_prompt()
+
+    async def _fetch_schema(self):
+        # Failed attempts also restart the refresh interval, so an unreachable
+        # server is retried once per interval rather than on every prompt
+        self._schema_fetched_at = time.monotonic()
         try:
             schema_result = await self.session.call_tool("get_schema", {})
             if hasattr(schema_result, 'content') and schema_result.content:
@@ -77,31 +192,31 @@ class MCPClient:
         except Exception as e:
             print(f"⚠️ Failed to fetch schema: {e}")
 
-    async def process_query(self, query: str) -> str:
-        extracted_data = extract_fields(query)
-        if extracted_data:
-            formatted_data = "\n".join([f"{k}: {v}" for k, v in extracted_data.items()])
-            query = f"Add this data to the Customer table:\n{formatted_data}"
-
-        def format_tool_params(tool):
-            if hasattr(tool, 'input_schema') and tool.input_schema and 'properties' in tool.input_schema:
-                params = [f'{name}: {prop.get("type", "any")}' for name, prop in tool.input_schema['properties'].items()]
+    async def _refresh_schema_if_stale(self):
+        if time.monotonic() - self._schema_fetched_at < SCHEMA_REFRESH_SECS:
+            return
+        old_schema = self.schema_text
+        await self._fetch_schema()
+        # Only a changed schema alters the prompt prefix
+        if self.schema_text != old_schema:
+            self._system_prompt = self._build_system_prompt()
+
+    @staticmethod
+    def format_tool_params(tool):
+        if hasattr(tool, 'input_schema') and tool.input_schema and 'properties' in tool.input_schema:
+            params = [f'{name}: {prop.get("type", "any")}' for name, prop in tool.input_schema['properties'].items()]
+            return ', '.join(params)
+        elif hasattr(tool, 'parameters') and tool.parameters:
+            if isinstance(tool.parameters, list):
+                params = [f'{param.name}: {param.type}' for param in tool.parameters if hasattr(param, 'name') and hasattr(param, 'type')]
                 return ', '.join(params)
-            elif hasattr(tool, 'parameters') and tool.parameters:
-                if isinstance(tool.parameters, list):
-                    params = [f'{param.name}: {param.type}' for param in tool.parameters if hasattr(param, 'name') and hasattr(param, 'type')]
-                    return ', '.join(params)
-            return ''
-
-        tool_descriptions = "\n".join([
-            f"- {tool.name}({format_tool_params(tool)}): {tool.description}"
-            for tool in self.tools
-        ])
+        return ''
 
-        system_prompt = (
+    def _build_system_prompt(self) -> str:
+        return (
             "You are a helpful assistant with access to database tools. Your primary purpose is to add new rows into the table. "
             "You have access to the following tools:\n"
-            f"{tool_descriptions}\n\n"
+            f"{self._tool_descriptions}\n\n"
             f"Here is the current table schema for your reference:\n{self.schema_text}\n\n"
             "IMPORTANT INSTRUCTIONS:\n"
             "- When users ask to INSERT, ADD, CREATE data or row or record to a table/database, you MUST use the insert_data tool.\n"
@@ -117,23 +232,40 @@ class MCPClient:
             "- Be concise, helpful, and avoid SQL examples.\n"
         )
 
-        lc_messages = [SystemMessage(content=system_prompt)]
-        lc_messages.extend(self.memory)
-        lc_messages.append(HumanMessage(content=query))
+    async def process_query(self, query: str) -> str:
+        query_lower = query.lower()
+        extracted_data = extract_fields(query) if any(kw in query_lower for kw in INSERT_KEYWORDS) else None
+        if extracted_data:
+            formatted_data = "\n".join([f"{k}: {v}" for k, v in extracted_data.items()])
+            query = f"Add this data to the Customer table:\n{formatted_data}"
 
-        llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
-        llm_response = llm.invoke(lc_messages)
+        # Stable prefix first, volatile history and query after, for provider prompt caching
+        lc_messages = [SystemMessage(content=self._system_prompt), *self.memory, HumanMessage(content=query)]
+
+        # Identical prompt + history + query gets the same reply without an LLM round-trip
+        cache_key = hashlib.sha256(json.dumps(
+            {"sys": self._system_prompt, "mem": [m.content for m in self.memory], "q": query},
+            sort_keys=True
+        ).encode()).hexdigest()
+        llm_response = self._llm_cache.get(cache_key)
+        if llm_response is not None:
+            self._llm_cache.move_to_end(cache_key)
+        else:
+            llm_response = self._llm.invoke(lc_messages)
         response_text = llm_response.content
 
-        self.memory.append(HumanMessage(content=query))
-        self.memory.append(llm_response)
-        MAX_MEMORY = 10
-        if len(self.memory) > MAX_MEMORY * 2:
-            self.memory = self.memory[-MAX_MEMORY*2:]
+        # A repeated question replaces the previous reply rather than adding a duplicate
+        # exchange; otherwise the deque evicts the oldest messages itself
+        if len(self.memory) >= 2 and self.memory[-2].content == query:
+            self.memory[-1] = llm_response
+        else:
+            self.memory.append(HumanMessage(content=query))
+            self.memory.append(llm_response)
 
-        if response_text.strip().startswith('{') and response_text.strip().endswith('}'):
+        stripped = response_text.strip()
+        if stripped[:1] == '{' and stripped[-1:] == '}':
             try:
-                json_response = json.loads(response_text)
+                json_response = _json_loads(stripped)
                 for key in ['response', 'answer', 'content', 'message']:
                     if key in json_response:
                         response_text = json_response[key]
@@ -143,9 +275,14 @@ class MCPClient:
 
         tool_name, params = parse_tool_response(response_text)
 
+        if tool_name not in WRITE_TOOLS and cache_key not in self._llm_cache:
+            self._llm_cache[cache_key] = llm_response
+            if len(self._llm_cache) > LLM_CACHE_SIZE:
+                self._llm_cache.popitem(last=False)
+
         # Handle plain tool call like "get_schema()"
         if not tool_name:
-            tool_call_match = re.match(r"get_schema\s*\(\s*\)?", response_text.strip(), re.IGNORECASE)
+            tool_call_match = _GET_SCHEMA_RE.match(response_text.strip())
             if tool_call_match:
                 tool_name = "get_schema"
                 params = {"table": "Customer", "schema": "SAC_1"}
@@ -173,27 +310,49 @@ class MCPClient:
             return "Sorry. I couldn't retrieve the data from the tool."
 
         try:
-            data = json.loads(result_text)
+            data = _json_loads(result_text)
         except json.JSONDecodeError:
             return f"Retrieved data: {result_text}"
 
+        # Write confirmations and tiny results need no second LLM round-trip
+        if tool_name in WRITE_TOOLS and isinstance(data, dict) and "message" in data:
+            return data["message"]
+        if isinstance(data, dict) and data.get("rows") == []:
+            return f"No rows found in {data.get('table', 'the table')}."
+        if len(result_text) < SMALL_RESULT_CHARS:
+            if not isinstance(data, (dict, list)):
+                return str(data)
+            # Only flat scalar payloads read well as "key: value" lines
+            if isinstance(data, dict):
+                fields = {key: value for key, value in data.items() if key != "object"}
+                if fields and not any(isinstance(value, (dict, list)) for value in fields.values()):
+                    return "\n".join(f"{key}: {value}" for key, value in fields.items())
+
         interpretation_prompt = (
             f"The user asked: \"{original_query}\"\n\n"
-            f"The tool '{tool_name}' returned this data:\n{json.dumps(data, indent=2)}\n\n"
+            f"The tool '{tool_name}' returned this data:\n{_json_dumps_indent(data)}\n\n"
             "Please provide a clear, direct answer to the user's question based on this data."
         )
 
-        llm = ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID)
         lc_messages = [HumanMessage(content=interpretation_prompt)]
-        interpretation_response = llm.invoke(lc_messages)
+        interpretation_response = self._llm.invoke(lc_messages)
 
         return interpretation_response.content
 
     async def chat_loop(self):
         print("\n🤖 S4HANA MCP Client Started — Type your queries or 'quit/exit' to exit.")
+        loop = asyncio.get_running_loop()
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                # Keep the schema warm while the user is typing
+                if self._schema_refresh is None or self._schema_refresh.done():
+                    self._schema_refresh = asyncio.create_task(self._refresh_schema_if_stale())
+
+                print("\nQuery: ", end="", flush=True)
+                line = await loop.run_in_executor(None, sys.stdin.readline)
+                if not line:
+                    break
+                query = line.strip()
                 if query.lower() in ('quit', 'exit'):
                     break
 
@@ -204,6 +363,11 @@ class MCPClient:
                 print(f"\n❌ Error: {str(e)}")
 
     async def cleanup(self):
+        # A refresh still in flight would otherwise fail against the closed session
+        if self._schema_refresh is not None and not self._schema_refresh.done():
+            self._schema_refresh.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._schema_refresh
         await self.exit_stack.aclose()
 
 async def main():
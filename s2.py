@@ -1,8 +1,12 @@
-from typing import Any, Dict
+from typing import Any, Dict, List
 from mcp.server.fastmcp import FastMCP
 from fastapi import Query, HTTPException, Body
 from hdbcli import dbapi
 import os
+import time
+import asyncio
+from queue import Queue
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,75 +19,158 @@ HANA_USER = os.getenv("HANA_USER")
 HANA_PASS = os.getenv("HANA_PASS")
 HANA_SCHEMA = os.getenv("HANA_SCHEMA")
 
-conn = dbapi.connect(
-    address=HANA_HOST,
-    port=HANA_PORT,
-    user=HANA_USER,
-    password=HANA_PASS,
-    encrypt=True,
-    sslValidateCertificate=False
-)
+POOL_SIZE = 8  # HANA connections shared by concurrent tool calls
+FETCH_ARRAYSIZE = 1000  # rows per fetchmany() round trip
+STATEMENT_CACHE_SIZE = 64  # prepared write statements kept per connection
+SCHEMA_CACHE_TTL = 60  # seconds a get_schema result is served without querying HANA
 
-@mcp.tool()
-async def get_schema():
-    cursor = conn.cursor()
+def _connect():
+    return dbapi.connect(
+        address=HANA_HOST,
+        port=HANA_PORT,
+        user=HANA_USER,
+        password=HANA_PASS,
+        encrypt=True,
+        sslValidateCertificate=False
+    )
+
+# Slots start empty and are connected on first use, so startup does not wait on N logins
+_POOL: Queue = Queue()
+for _ in range(POOL_SIZE):
+    _POOL.put(None)
+
+# Prepared statements live on their connection: {connection: {statement key: prepared cursor}}
+_STMT_CACHE: Dict[Any, Dict[tuple, Any]] = {}
+
+# {"schema.table": (monotonic fetch time, get_schema payload)}
+_SCHEMA_CACHE: Dict[str, tuple[float, dict]] = {}
+
+@contextmanager
+def _connection():
+    """Borrow a pooled connection, reconnecting if it was never opened or has dropped"""
+    conn = _POOL.get()
     try:
-        cursor.execute(f"""
-            SELECT COLUMN_NAME, DATA_TYPE_NAME
-            FROM SYS.TABLE_COLUMNS
-            WHERE SCHEMA_NAME = '{HANA_SCHEMA}' AND TABLE_NAME = 'Customer'
-        """)
-        results = cursor.fetchall()
+        if conn is None or not conn.isconnected():
+            _STMT_CACHE.pop(conn, None)
+            conn = _connect()
+        yield conn
     finally:
-        cursor.close()
+        _POOL.put(conn)
+
+def _fetch(sql, params=(), as_dicts=False):
+    """Run a query on a pooled connection; rows come back as tuples or column dicts"""
+    with _connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            columns = [desc[0] for desc in cursor.description]
+            # Build row dicts batch by batch instead of holding every tuple alongside them
+            cursor.arraysize = FETCH_ARRAYSIZE
+            rows = []
+            while chunk := cursor.fetchmany():
+                rows.extend((dict(zip(columns, row)) for row in chunk) if as_dicts else chunk)
+        finally:
+            cursor.close()
+    return rows
+
+def _execute(key, sql, params, many=False):
+    """Run a write on a pooled connection and commit it.
+
+    key identifies the statement shape, e.g. ("insert", table, columns); the
+    statement is prepared once per connection and re-executed for later calls.
+    """
+    with _connection() as conn:
+        statements = _STMT_CACHE.setdefault(conn, {})
+        cursor = statements.pop(key, None)
+        if cursor is None:
+            cursor = conn.cursor()
+            try:
+                cursor.prepare(sql)
+            except dbapi.Error:
+                cursor.close()
+                raise
+        try:
+            if many:
+                cursor.executemanyprepared(params)
+            else:
+                cursor.executeprepared(params)
+            conn.commit()
+        except dbapi.Error:
+            cursor.close()
+            raise
+        # Most recently used last; the oldest statement is closed once the cache is full
+        statements[key] = cursor
+        if len(statements) > STATEMENT_CACHE_SIZE:
+            statements.pop(next(iter(statements))).close()
+
+# hdbcli calls block, so they run in worker threads and the event loop keeps serving requests
+@mcp.tool()
+async def get_schema():
+    cache_key = f"{HANA_SCHEMA}.Customer"
+    cached = _SCHEMA_CACHE.get(cache_key)
+    if cached and time.monotonic() - cached[0] < SCHEMA_CACHE_TTL:
+        return cached[1]
+
+    results = await asyncio.to_thread(_fetch, """
+        SELECT COLUMN_NAME, DATA_TYPE_NAME
+        FROM SYS.TABLE_COLUMNS
+        WHERE SCHEMA_NAME = ? AND TABLE_NAME = ?
+    """, (HANA_SCHEMA, "Customer"))
 
     fields = [
         {"name": column_name, "type": data_type.lower()}
         for column_name, data_type in results
     ]
 
-    return {
+    payload = {
         "table": "Customer",
         "fields": fields
     }
+    _SCHEMA_CACHE[cache_key] = (time.monotonic(), payload)
+    return payload
+
+@mcp.tool()
+async def refresh_schema():
+    """Drop the cached schema and read it again from SAP HANA, e.g. after DDL changes"""
+    _SCHEMA_CACHE.clear()
+    return await get_schema()
 
 @mcp.tool()
 async def insert_data(
     table: str = Query(..., description="Table name"),
-    data: Dict[str, Any] = Body(..., description="Column-value pairs")
+    data: Dict[str, Any] | List[Dict[str, Any]] = Body(..., description="Column-value pairs, or a list of them for several rows")
 ):
-    cursor = conn.cursor()
+    rows = [data] if isinstance(data, dict) else data
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows to insert")
+    # Sorted so rows with the same columns in any order share one prepared statement
+    cols = sorted(rows[0])
+    if any(row.keys() != rows[0].keys() for row in rows[1:]):
+        raise HTTPException(status_code=400, detail="All rows must have the same columns")
+
+    columns = ', '.join(f'"{col}"' for col in cols)
+    placeholders = ', '.join('?' for _ in cols)
+    sql = f'INSERT INTO "{HANA_SCHEMA}"."{table}" ({columns}) VALUES ({placeholders})'
     try:
-        columns = ', '.join(f'"{col}"' for col in data.keys())
-        placeholders = ', '.join('?' for _ in data)
-        values = list(data.values())
-        sql = f'INSERT INTO "{HANA_SCHEMA}"."{table}" ({columns}) VALUES ({placeholders})'
-        cursor.execute(sql, values)
-        conn.commit()
+        await asyncio.to_thread(_execute, ("insert", table, tuple(cols)), sql,
+                                [tuple(row[col] for col in cols) for row in rows], many=True)
     except dbapi.Error as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
 
-    return {"message": f"Row inserted into '{table}'", "data": data}
+    return {"message": f"{len(rows)} row(s) inserted into '{table}'", "data": data}
 
 @mcp.tool()
 async def get_data(
     table: str = Query(..., description="Table name")
 ):
-    cursor = conn.cursor()
     try:
-        cursor.execute(f'SELECT * FROM "{HANA_SCHEMA}"."{table}" LIMIT 100')
-        columns = [desc[0] for desc in cursor.description]
-        rows = cursor.fetchall()
+        rows = await asyncio.to_thread(_fetch, f'SELECT * FROM "{HANA_SCHEMA}"."{table}" LIMIT 100', as_dicts=True)
     except dbapi.Error as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
 
     return {
         "table": table,
-        "rows": [dict(zip(columns, row)) for row in rows]
+        "rows": rows
     }
 
 if __name__ == "__main__":
@@ -2,9 +2,17 @@ from typing import Any
 from mcp.server.fastmcp import FastMCP
 from fastapi import FastAPI, Query, HTTPException, Body
 from hdbcli import dbapi
-from typing import Dict, Any
+from typing import Dict, Any, List
 import os
+import time
+import asyncio
+import json
+import inspect
+import functools
+from queue import Queue
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from pydantic.fields import FieldInfo
  
 # Load environment variables
 load_dotenv()
@@ -18,30 +26,106 @@ HANA_PORT = int(os.getenv("HANA_PORT", "443"))
 HANA_USER = os.getenv("HANA_USER")
 HANA_PASS = os.getenv("HANA_PASS")
 HANA_SCHEMA = os.getenv("HANA_SCHEMA")
+LLM_DEPLOYMENT_ID = "d38dd2015862a15d"
  
 # Connect to SAP HANA Cloud
-conn = dbapi.connect(
-    address=HANA_HOST,
-    port=HANA_PORT,
-    user=HANA_USER,
-    password=HANA_PASS,
-    encrypt=True,
-    sslValidateCertificate=False
-)
+POOL_SIZE = 8  # HANA connections shared by concurrent tool calls
+FETCH_ARRAYSIZE = 1000  # rows per fetchmany() round trip
+STATEMENT_CACHE_SIZE = 64  # prepared write statements kept per connection
+SCHEMA_CACHE_TTL = 60  # seconds a get_schema result is served without querying HANA
+ 
+def _connect():
+    return dbapi.connect(
+        address=HANA_HOST,
+        port=HANA_PORT,
+        user=HANA_USER,
+        password=HANA_PASS,
+        encrypt=True,
+        sslValidateCertificate=False
+    )
+ 
+# Slots start empty and are connected on first use, so startup does not wait on N logins
+_POOL: Queue = Queue()
+for _ in range(POOL_SIZE):
+    _POOL.put(None)
+ 
+# Prepared statements live on their connection: {connection: {statement key: prepared cursor}}
+_STMT_CACHE: Dict[Any, Dict[tuple, Any]] = {}
+ 
+# {schema name: (monotonic fetch time, get_schema payload)}
+_SCHEMA_CACHE: Dict[str, tuple[float, dict]] = {}
+ 
+@contextmanager
+def _connection():
+    """Borrow a pooled connection, reconnecting if it was never opened or has dropped"""
+    conn = _POOL.get()
+    try:
+        if conn is None or not conn.isconnected():
+            _STMT_CACHE.pop(conn, None)
+            conn = _connect()
+        yield conn
+    finally:
+        _POOL.put(conn)
+ 
+def _fetch(sql, params=(), as_dicts=False):
+    """Run a query on a pooled connection; rows come back as tuples or column dicts"""
+    with _connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            columns = [desc[0] for desc in cursor.description]
+            # Build row dicts batch by batch instead of holding every tuple alongside them
+            cursor.arraysize = FETCH_ARRAYSIZE
+            rows = []
+            while chunk := cursor.fetchmany():
+                rows.extend((dict(zip(columns, row)) for row in chunk) if as_dicts else chunk)
+        finally:
+            cursor.close()
+    return rows
+ 
+def _execute(key, sql, params, many=False):
+    """Run a write on a pooled connection and commit it.
+ 
+    key identifies the statement shape, e.g. ("insert", table, columns); the
+    statement is prepared once per connection and re-executed for later calls.
+    """
+    with _connection() as conn:
+        statements = _STMT_CACHE.setdefault(conn, {})
+        cursor = statements.pop(key, None)
+        if cursor is None:
+            cursor = conn.cursor()
+            try:
+                cursor.prepare(sql)
+            except dbapi.Error:
+                cursor.close()
+                raise
+        try:
+            if many:
+                cursor.executemanyprepared(params)
+            else:
+                cursor.executeprepared(params)
+            conn.commit()
+        except dbapi.Error:
+            cursor.close()
+            raise
+        # Most recently used last; the oldest statement is closed once the cache is full
+        statements[key] = cursor
+        if len(statements) > STATEMENT_CACHE_SIZE:
+            statements.pop(next(iter(statements))).close()
  
 #Implementing tool execution
+# hdbcli calls block, so they run in worker threads and the event loop keeps serving requests
 @mcp.tool()
 async def get_schema():
-    cursor = conn.cursor()
-    try:
-        cursor.execute(f"""
-            SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE_NAME
-            FROM SYS.TABLE_COLUMNS
-            WHERE SCHEMA_NAME = '{HANA_SCHEMA}'
-        """)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
+    cached = _SCHEMA_CACHE.get(HANA_SCHEMA)
+    if cached and time.monotonic() - cached[0] < SCHEMA_CACHE_TTL:
+        return cached[1]
+ 
+    results = await asyncio.to_thread(_fetch, """
+        SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE_NAME
+        FROM SYS.TABLE_COLUMNS
+        WHERE SCHEMA_NAME = ?
+    """, (HANA_SCHEMA,))
  
     schema: Dict[str, Dict] = {}
     for table_name, column_name, data_type in results:
@@ -52,51 +136,59 @@ async def get_schema():
             "type": data_type.lower()
         })
  
-    return {
+    payload = {
         "version": "1.0",
         "schema": schema
     }
+    _SCHEMA_CACHE[HANA_SCHEMA] = (time.monotonic(), payload)
+    return payload
+ 
+@mcp.tool()
+async def refresh_schema():
+    """Drop the cached schema and read it again from SAP HANA, e.g. after DDL changes"""
+    _SCHEMA_CACHE.pop(HANA_SCHEMA, None)
+    return await get_schema()
  
 @mcp.tool()
 async def get_data(table: str = Query(..., description="SAP HANA table name")):
-    cursor = conn.cursor()
     try:
-        cursor.execute(f'SELECT * FROM "{HANA_SCHEMA}"."{table}" LIMIT 100')
-        columns = [desc[0] for desc in cursor.description]
-        rows = cursor.fetchall()
+        rows = await asyncio.to_thread(_fetch, f'SELECT * FROM "{HANA_SCHEMA}"."{table}" LIMIT 100', as_dicts=True)
     except dbapi.Error as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
  
     return {
         "object": "list",
         "table": table,
-        "rows": [dict(zip(columns, row)) for row in rows]
+        "rows": rows
     }
  
 @mcp.tool()
-def insert_data(
+async def insert_data(
     table: str = Query(..., description="SAP HANA table name"),
-    data: Dict[str, Any] = Body(..., description="Column-value pairs to insert")
+    data: Dict[str, Any] | List[Dict[str, Any]] = Body(..., description="Column-value pairs to insert, or a list of them for several rows")
 ):
-    cursor = conn.cursor()
-    try:
-        col_clause = ', '.join(f'"{col}"' for col in data.keys())
-        val_clause = ', '.join(['?' for _ in data])
-        values = list(data.values())
+    rows = [data] if isinstance(data, dict) else data
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows to insert")
+    # Sorted so rows with the same columns in any order share one prepared statement
+    columns = sorted(rows[0])
+    if any(row.keys() != rows[0].keys() for row in rows[1:]):
+        raise HTTPException(status_code=400, detail="All rows must have the same columns")
+ 
+    col_clause = ', '.join(f'"{col}"' for col in columns)
+    val_clause = ', '.join(['?' for _ in columns])
  
-        sql = f'INSERT INTO "{HANA_SCHEMA}"."{table}" ({col_clause}) VALUES ({val_clause})'
-        cursor.execute(sql, values)
-        conn.commit()
+    # One array-bound round trip and one commit for the whole batch
+    sql = f'INSERT INTO "{HANA_SCHEMA}"."{table}" ({col_clause}) VALUES ({val_clause})'
+    try:
+        await asyncio.to_thread(_execute, ("insert", table, tuple(columns)), sql,
+                                [tuple(row[col] for col in columns) for row in rows], many=True)
     except dbapi.Error as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
  
     return {
         "object": "insert_result",
-        "message": f"Successfully inserted row into '{table}'",
+        "message": f"Successfully inserted {len(rows)} row(s) into '{table}'",
         "data": data
     }
  
@@ -105,17 +197,14 @@ async def delete_data(
     table: str = Query(..., description="SAP HANA table name"),
     where: dict = Body(..., description="WHERE clause column-value pairs")
 ):
-    cursor = conn.cursor()
+    where_cols = sorted(where)
+    where_clause = ' AND '.join(f'"{col}" = ?' for col in where_cols)
+    values = [where[col] for col in where_cols]
+    sql = f'DELETE FROM "{HANA_SCHEMA}"."{table}" WHERE {where_clause}'
     try:
-        where_clause = ' AND '.join(f'"{col}" = ?' for col in where.keys())
-        values = list(where.values())
-        sql = f'DELETE FROM "{HANA_SCHEMA}"."{table}" WHERE {where_clause}'
-        cursor.execute(sql, values)
-        conn.commit()
+        await asyncio.to_thread(_execute, ("delete", table, tuple(where_cols)), sql, values)
     except dbapi.Error as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
     return {
         "object": "delete_result",
         "message": f"Successfully deleted row(s) from '{table}'",
@@ -128,18 +217,15 @@ async def update_data(
     data: dict = Body(..., description="Column-value pairs to update"),
     where: dict = Body(..., description="WHERE clause column-value pairs")
 ):
-    cursor = conn.cursor()
+    data_cols, where_cols = sorted(data), sorted(where)
+    set_clause = ', '.join(f'"{col}" = ?' for col in data_cols)
+    where_clause = ' AND '.join(f'"{col}" = ?' for col in where_cols)
+    values = [data[col] for col in data_cols] + [where[col] for col in where_cols]
+    sql = f'UPDATE "{HANA_SCHEMA}"."{table}" SET {set_clause} WHERE {where_clause}'
     try:
-        set_clause = ', '.join(f'"{col}" = ?' for col in data.keys())
-        where_clause = ' AND '.join(f'"{col}" = ?' for col in where.keys())
-        values = list(data.values()) + list(where.values())
-        sql = f'UPDATE "{HANA_SCHEMA}"."{table}" SET {set_clause} WHERE {where_clause}'
-        cursor.execute(sql, values)
-        conn.commit()
+        await asyncio.to_thread(_execute, ("update", table, tuple(data_cols), tuple(where_cols)), sql, values)
     except dbapi.Error as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
     return {
         "object": "update_result",
         "message": f"Successfully updated row(s) in '{table}'",
@@ -147,6 +233,82 @@ async def update_data(
         "where": where
     }
  
+#Compound request: run a tool and interpret its result without a client round-trip
+def format_simple_result(data):
+    """Answer tiny tool results locally (same rules as c2.py and c3.py); None means ask the LLM"""
+    if not isinstance(data, (dict, list)):
+        return str(data)
+    if not isinstance(data, dict):
+        return None
+    # Write confirmations already carry a human-readable message
+    if "message" in data and str(data.get("object", "")).endswith("_result"):
+        return f"✅ {data['message']}"
+    for key in ('count', 'total'):
+        value = data.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f"{key.capitalize()}: {value}"
+    if 0 < len(data) <= 2 and all(isinstance(v, (str, int, float, bool)) or v is None for v in data.values()):
+        return ", ".join(f"{k}: {v}" for k, v in data.items())
+    return None
+ 
+@functools.cache
+def _interpretation_llm():
+    """Import and build the LLM client on the first invoke_and_interpret call.
+ 
+    Plain DB tool use then needs neither the AI Core SDK nor its credentials.
+    """
+    from gen_ai_hub.proxy.langchain.openai import ChatOpenAI
+    from langchain.schema.messages import HumanMessage
+    return ChatOpenAI(deployment_id=LLM_DEPLOYMENT_ID), HumanMessage
+ 
+def _bind_tool_args(tool_name, tool, params):
+    """Match params to a tool's signature the way FastMCP would, rejecting missing required ones"""
+    kwargs = {}
+    for name, parameter in inspect.signature(tool).parameters.items():
+        if name in params:
+            kwargs[name] = params[name]
+        elif isinstance(parameter.default, FieldInfo) and not parameter.default.is_required():
+            kwargs[name] = parameter.default.get_default(call_default_factory=True)
+        elif isinstance(parameter.default, FieldInfo) or parameter.default is inspect.Parameter.empty:
+            raise HTTPException(status_code=400, detail=f"Missing required parameter '{name}' for tool '{tool_name}'")
+    return kwargs
+ 
+@mcp.tool()
+async def invoke_and_interpret(
+    query: str = Body(..., description="Original user question"),
+    tool_name: str = Body(..., description="Tool to run before interpreting"),
+    params: Dict[str, Any] = Body(..., description="Arguments for the tool")
+):
+    tool = _INTERPRETABLE_TOOLS.get(tool_name)
+    if tool is None:
+        raise HTTPException(status_code=400, detail=f"Unknown tool '{tool_name}'")
+ 
+    result = tool(**_bind_tool_args(tool_name, tool, params))
+    if inspect.isawaitable(result):
+        result = await result
+ 
+    simple_answer = format_simple_result(result)
+    if simple_answer is not None:
+        return simple_answer
+ 
+    interpretation_prompt = (
+        f"The user asked: \"{query}\"\n\n"
+        f"The tool '{tool_name}' returned this data:\n{json.dumps(result, indent=2, default=str)}\n\n"
+        "Please provide a clear, direct answer to the user's question based on this data. Be concise and avoid technical details unless necessary."
+    )
+    llm, HumanMessage = _interpretation_llm()
+    interpretation_response = await llm.ainvoke([HumanMessage(content=interpretation_prompt)])
+    return interpretation_response.content
+ 
+_INTERPRETABLE_TOOLS = {
+    "get_schema": get_schema,
+    "refresh_schema": refresh_schema,
+    "get_data": get_data,
+    "insert_data": insert_data,
+    "delete_data": delete_data,
+    "update_data": update_data,
+}
+ 
  
  
 #Running the server